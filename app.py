@@ -1,62 +1,206 @@
+import os
+import sys
+import gzip
+import hashlib
+import time
+import asyncio
 from pathlib import Path
-from flask import Flask, jsonify, render_template_string, request
+from typing import Any
+import orjson
+from quart import Quart, Response, jsonify, request, websocket
+from quart.json.provider import DefaultJSONProvider
 
 from mpv_controller import MPVController
 
-MEDIA_DIR = Path("/media")
+try:
+    import inotify_simple
+except ImportError:  # non-Linux hosts rely on the TTL alone
+    inotify_simple = None
 
-with open("index.html", "r") as index:
-    INDEX_HTML = index.read()
+MEDIA_DIR = Path("/media")
+_MEDIA_ROOT = os.fspath(MEDIA_DIR)
+
+_CACHE_TTL = 5
+_movies_cache = {"t": float("-inf"), "v": [], "s": frozenset(), "b": b"", "e": ""}
+_movies_gen = 0  # bumped by the MEDIA_DIR watcher
+_movies_lock = asyncio.Lock()
+
+_INDEX_BYTES = Path(__file__).with_name("index.html").read_bytes()
+_INDEX_GZIP = gzip.compress(_INDEX_BYTES, 9)
+_INDEX_HEADERS = {"Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def _json_cached(body: bytes, etag: str) -> Response:
+    """JSON response that answers 304 when the client already has `body`."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(b"", status=304, headers=headers)
+    return Response(body, mimetype="application/json", headers=headers)
+
+
+def _scan_movies() -> list[str]:
+    try:
+        with os.scandir(MEDIA_DIR) as it:
+            return [e.name for e in it if e.name.endswith(".mkv") and e.is_file()]
+    except FileNotFoundError:
+        return []
+
+
+async def _movies() -> dict[str, Any]:
+    if time.monotonic() - _movies_cache["t"] < _CACHE_TTL:
+        return _movies_cache
+    async with _movies_lock:  # one scan at a time, waiters reuse its result
+        if time.monotonic() - _movies_cache["t"] >= _CACHE_TTL:
+            gen, now = _movies_gen, time.monotonic()
+            # may be slow (NFS, big libraries), keep it off the event loop
+            names = await asyncio.to_thread(_scan_movies)
+            _movies_cache["v"] = sorted(names)
+            _movies_cache["s"] = frozenset(names)
+            _movies_cache["b"] = orjson.dumps(_movies_cache["v"])
+            _movies_cache["e"] = _etag(_movies_cache["b"])
+            if gen == _movies_gen:  # else MEDIA_DIR changed mid-scan
+                _movies_cache["t"] = now
+    return _movies_cache
+
+
+def _watch_media_dir() -> "inotify_simple.INotify | None":
+    """Drop the movies cache as soon as MEDIA_DIR changes."""
+    if inotify_simple is None:
+        return None
+    flags = inotify_simple.flags
+    ino = inotify_simple.INotify()
+    try:
+        ino.add_watch(
+            MEDIA_DIR,
+            flags.CREATE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM,
+        )
+    except OSError:
+        ino.close()
+        return None
+
+    def invalidate():
+        global _movies_gen
+        ino.read(timeout=0)
+        _movies_gen += 1
+        _movies_cache["t"] = float("-inf")
+
+    asyncio.get_running_loop().add_reader(ino.fileno(), invalidate)
+    return ino
 
 
 def create_app():
-    app = Flask(__name__)
+    app = Quart(__name__)
+    app.json = ORJSONProvider(app)
     mpv = MPVController()
 
+    media_watch = None
+
+    @app.before_serving
+    async def watch_media():
+        nonlocal media_watch
+        media_watch = _watch_media_dir()
+
+    @app.after_serving
+    async def unwatch_media():
+        if media_watch is not None:
+            asyncio.get_running_loop().remove_reader(media_watch.fileno())
+            media_watch.close()
+
+    @app.before_serving
+    async def prewarm():
+        # spawn the idle player in the background so binding isn't delayed
+        app.add_background_task(mpv._spawn_if_needed)
+
+    @app.after_serving
+    async def shutdown():
+        # don't leave the idle player behind for the next start to orphan
+        try:
+            await mpv.stop()
+        except (RuntimeError, OSError):
+            if mpv.proc is not None and mpv.proc.returncode is None:
+                mpv.proc.kill()
+                await mpv.proc.wait()
+
     @app.get("/")
-    def index():
-        return render_template_string(INDEX_HTML)
+    async def index():
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            headers = {**_INDEX_HEADERS, "Content-Encoding": "gzip"}
+            return Response(_INDEX_GZIP, mimetype="text/html", headers=headers)
+        return Response(_INDEX_BYTES, mimetype="text/html", headers=_INDEX_HEADERS)
 
     @app.get("/api/movies")
-    def movies():
-        return jsonify(sorted([f.name for f in MEDIA_DIR.glob("*.mkv")]))
+    async def movies():
+        cache = await _movies()
+        return _json_cached(cache["b"], cache["e"])
 
     @app.post("/api/play")
-    def play():
+    async def play():
         print("PLAYING")
 
-        file = request.get_json(force=True).get("file")
-        path = MEDIA_DIR / file if file else None
+        try:
+            body = await request.get_data(cache=False)
+            data = orjson.loads(body) if body else {}
+        except orjson.JSONDecodeError:
+            return jsonify(error="invalid JSON"), 400
 
-        if path is None or not path.exists():
+        file = data.get("file") if isinstance(data, dict) else None
+        if not isinstance(file, str):
+            return jsonify(error="expected {\"file\": <name>}"), 400
+
+        # strip any directory part, then only accept names from the listing
+        name = os.path.basename(file)
+        if name not in (await _movies())["s"]:
             return jsonify(error="file not found"), 404
 
-        mpv.start(str(path))
+        await mpv.play(os.path.join(_MEDIA_ROOT, name))
         return "", 204
 
     @app.post("/api/pause")
-    def pause():
-        mpv.pause()
+    async def pause():
+        await mpv.pause()
         return "", 204
 
     @app.post("/api/stop")
-    def stop():
-        mpv.stop()
+    async def stop():
+        await mpv.stop()
         return "", 204
 
     @app.post("/api/seek")
-    def seek():
-        mpv.seek(int(request.args.get("delta", 0)))
+    async def seek():
+        await mpv.seek(int(request.args.get("delta", 0)))
         return "", 204
 
     @app.post("/api/volume")
-    def volume():
-        mpv.volume(int(request.args.get("delta", 0)))
+    async def volume():
+        await mpv.volume(int(request.args.get("delta", 0)))
         return "", 204
 
     @app.get("/api/status")
-    def status():
-        return jsonify(mpv.status())
+    async def status():
+        body = orjson.dumps(await mpv.status())
+        return _json_cached(body, _etag(body))
+
+    @app.websocket("/ws")
+    async def ws():
+        queue = mpv.subscribe()
+        try:
+            await websocket.send(orjson.dumps(await mpv.status()).decode())
+            while True:
+                await websocket.send(orjson.dumps(await queue.get()).decode())
+        finally:
+            mpv.unsubscribe(queue)
 
     return app
 
@@ -67,10 +211,26 @@ def main():
     p.add_argument("--host", default="0.0.0.0")
     p.add_argument("--port", type=int, default=5000)
     p.add_argument("--debug", action="store_true", default=False)
+    p.add_argument("--prod", action="store_true", default=False,
+                   help="serve with uvicorn instead of the dev server")
     a = p.parse_args()
 
+    if a.prod:
+        import importlib.util
+        if importlib.util.find_spec("uvicorn") is None:
+            p.error("--prod needs uvicorn (pip install uvicorn)")
+        # same interpreter, so uvicorn sees this environment's packages;
+        # single worker - the mpv controller is per-process state
+        os.execv(sys.executable, [
+            sys.executable, "-m", "uvicorn", "app:create_app", "--factory",
+            "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+            "--workers", "1", "--loop", "auto", "--backlog", "512",
+            "--host", a.host, "--port", str(a.port),
+            "--log-level", "debug" if a.debug else "info",
+        ])
+
     app = create_app()
-    app.run(host=a.host, port=a.port, debug=a.debug, threaded=True)
+    app.run(host=a.host, port=a.port, debug=a.debug, use_reloader=a.debug)
 
 
 if __name__ == "__main__":
@@ -4,22 +4,33 @@ Controller object for managing mpv process and IPC communication.
 
 Features
 ========
-- Start/Stop mpv process
+- Start/Stop idle mpv process, media is swapped in with `loadfile`
 - Send commands over UNIX socket:
   * pause   -> toggle pause
   * seek    -> move forward/backward relative to current timestamp
   * volume  -> increase/decrease volume
   * status  -> fetch app status
+- Observe player properties and push status changes to subscribers
 """
 
 import os
-import time
-import json
-import socket
-import subprocess
+import asyncio
+import logging
+import itertools
 from typing import Any, Optional
 
+import orjson
+
+try:
+    import inotify_simple
+except ImportError:  # non-Linux hosts fall back to polling
+    inotify_simple = None
+
+log = logging.getLogger(__name__)
+
 MPV_SOCKET = "/tmp/mpv-socket"
+MPV_READ_LIMIT = 1 << 20  # replies like `track-list` can exceed the 64KiB default
+MPV_OBSERVED = ["path", "pause", "volume"]
 MPV_PARAMS = [
     "--audio-device=alsa/hdmi:CARD=PCH,DEV=0",  # modify depending on host
     "--fullscreen",
@@ -31,7 +42,15 @@ MPV_PARAMS = [
 class MPVController:
     def __init__(self, socket_path: str = MPV_SOCKET):
         self.socket_path = socket_path
-        self.proc: subprocess.Popen[str] | None = None
+        self.proc: asyncio.subprocess.Process | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._futs: dict[int, asyncio.Future] = {}
+        self._props: dict[str, Any] = {}
+        self._subscribers: set[asyncio.Queue] = set()
+        self._lock = asyncio.Lock()
+        self._spawn_lock = asyncio.Lock()
+        self._rids = itertools.count(1)
 
     def __clean_socket(self):
         try:
@@ -39,93 +58,257 @@ class MPVController:
         except FileNotFoundError:
             pass
 
-    def start(self, media: str):
-        self.stop()
-        self.__clean_socket()
+    async def _spawn_if_needed(self):
+        async with self._spawn_lock:
+            if self.proc is not None and self.proc.returncode is None:
+                return
+            self.__disconnect()
+            self.__clean_socket()
+
+            cmd = [
+                "mpv",
+                f"--input-ipc-server={self.socket_path}",
+                "--idle=yes",
+                *MPV_PARAMS,
+            ]
+            ino = self.__watch_socket()
+            try:
+                self.proc = await asyncio.create_subprocess_exec(*cmd)
+                await self.__wait_socket(ino)
+            finally:
+                if ino is not None:
+                    ino.close()
+            async with self._lock:
+                try:
+                    await self.__connect()  # start observing right away
+                except RuntimeError:
+                    pass  # bound but not listening yet, next command retries
+
+    async def play(self, media: str):
+        await self._spawn_if_needed()
+        await self.command(["loadfile", media, "replace"])
+
+    def __watch_socket(self) -> "inotify_simple.INotify | None":
+        # watch must be registered before spawning mpv so the create isn't missed
+        if inotify_simple is None:
+            return None
+        ino = inotify_simple.INotify()
+        ino.add_watch(
+            os.path.dirname(self.socket_path), inotify_simple.flags.CREATE
+        )
+        return ino
 
-        cmd = [
-            "mpv",
-            f"--input-ipc-server={self.socket_path}",
-            *MPV_PARAMS,
-            media,
-        ]
-        self.proc = subprocess.Popen(cmd)
-
-        for _ in range(50):
-            if os.path.exists(self.socket_path):
-                break
-            time.sleep(0.1)
-        else:
+    async def __wait_socket(self, ino: "inotify_simple.INotify | None"):
+        if ino is None:
+            for _ in range(50):
+                if os.path.exists(self.socket_path):
+                    return
+                await asyncio.sleep(0.1)
             raise RuntimeError("IPC socket not found after starting mpv")
 
-    def stop(self):
-        if self.proc and self.proc.poll() is None:
-            self.command(["quit"])
+        name = os.path.basename(self.socket_path)
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(ino.fileno(), ready.set)
+        try:
+            async with asyncio.timeout(5):
+                found = False
+                while not found:
+                    await ready.wait()
+                    ready.clear()
+                    found = any(ev.name == name for ev in ino.read(timeout=0))
+        except TimeoutError:
+            raise RuntimeError("IPC socket not found after starting mpv")
+        finally:
+            loop.remove_reader(ino.fileno())
+
+    async def stop(self):
+        if self.proc and self.proc.returncode is None:
+            await self.command(["quit"])
             try:
-                self.proc.wait(timeout=3)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(self.proc.wait(), timeout=3)
+            except TimeoutError:
                 self.proc.kill()
+                await self.proc.wait()
         self.proc = None
+        self.__disconnect()
         self.__clean_socket()
 
-    def __send_recv(self, payload: dict[str, Any]) -> dict[str, Any]:
-        if not os.path.exists(self.socket_path):
-            raise RuntimeError("IPC socket absent")
-        with socket.socket(socket.AF_UNIX) as s:
-            s.connect(self.socket_path)
-            s.sendall(json.dumps(payload).encode()+b"\n")
-            data = b""
+    async def __connect(self):
+        try:
+            reader, self._writer = await asyncio.open_unix_connection(
+                self.socket_path, limit=MPV_READ_LIMIT
+            )
+        except OSError as exc:  # missing, stale or not yet listening
+            raise RuntimeError("IPC socket unavailable") from exc
+        # each connection gets its own table so a dying dispatcher only
+        # fails the requests that were sent on its connection
+        self._futs = {}
+        self._props = {}
+        self._dispatcher = asyncio.create_task(
+            self.__dispatch(reader, self._writer, self._futs)
+        )
+        # replies carry request_id 0, which the dispatcher drops
+        self._writer.write(b"".join(
+            orjson.dumps({"command": ["observe_property", i, p]})+b"\n"
+            for i, p in enumerate(MPV_OBSERVED, 1)
+        ))
+
+    def __disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._writer = self._dispatcher = None
+
+    async def __dispatch(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        futs: dict[int, asyncio.Future],
+    ):
+        """Route replies to waiting callers by request_id."""
+        try:
             while True:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-                if b"\n" in chunk:
-                    break
-            return json.loads(data.decode())
-
-    def command(self, cmd: list[str]):
-        self.__send_recv({"command": cmd})
-
-    def get(self, prop: str) -> Any:
-        resp = self.__send_recv({"command": ["get_property", prop]})
+                resp = orjson.loads(await reader.readuntil(b"\n"))
+                if resp.get("event") == "property-change":
+                    self.__on_change(resp["name"], resp.get("data"))
+                    continue
+                if "event" in resp:
+                    continue
+                fut = futs.pop(resp.get("request_id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(resp)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # mpv went away
+        except (ValueError, asyncio.LimitOverrunError):  # bad or oversized line
+            log.exception("unreadable mpv IPC reply, dropping connection")
+        finally:
+            for fut in futs.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("IPC connection lost"))
+            futs.clear()
+            if self._writer is writer:
+                self._writer.close()
+                self._writer = self._dispatcher = None
+            self.__publish({"running": False})
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue that always holds the latest status pushed by mpv."""
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def __publish(self, status: dict[str, Any]):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # slow client, only the latest matters
+            queue.put_nowait(status)
+
+    def __on_change(self, name: str, data: Any):
+        self._props[name] = data
+        if len(self._props) == len(MPV_OBSERVED):
+            self.__publish(self.__status(self._props))
+
+    async def __send_recv_many(
+        self, payloads: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        for _ in range(2):  # reconnect once if the write hit a stale connection
+            async with self._lock:
+                if self._writer is None:
+                    await self.__connect()
+            writer, futs = self._writer, self._futs
+
+            pending = []
+            for payload in payloads:
+                payload["request_id"] = rid = next(self._rids)
+                futs[rid] = fut = loop.create_future()
+                pending.append(fut)
+            try:
+                writer.write(b"".join(orjson.dumps(p)+b"\n" for p in payloads))
+                await writer.drain()
+            except ConnectionError:
+                for payload in payloads:
+                    futs.pop(payload["request_id"], None)
+                if self._writer is writer:
+                    self.__disconnect()
+                continue
+            try:
+                return list(await asyncio.gather(*pending))
+            except ConnectionError:
+                # mpv may already have run it, resending could repeat a
+                # non-idempotent command like `cycle pause`
+                raise RuntimeError("IPC connection lost") from None
+        raise RuntimeError("IPC connection lost")
+
+    async def __send_recv(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return (await self.__send_recv_many([payload]))[0]
+
+    async def command(self, cmd: list[str]):
+        await self.__send_recv({"command": cmd})
+
+    async def get(self, prop: str) -> Any:
+        resp = await self.__send_recv({"command": ["get_property", prop]})
         return resp.get("data")
 
-    def show_text(self, text: str, duration_ms: int = 1000):
+    async def _multi_get(self, props: list[str]) -> dict[str, Any]:
+        resps = await self.__send_recv_many(
+            [{"command": ["get_property", p]} for p in props]
+        )
+        return {p: r.get("data") for p, r in zip(props, resps)}
+
+    async def show_text(self, text: str, duration_ms: int = 1000):
         try:
-            self.command(["show-text", text, str(duration_ms)])
+            await self.command(["show-text", text, str(duration_ms)])
         except RuntimeError:
             pass  # socket gone (player stopped)
 
-    def pause(self):
-        self.command(["cycle", "pause"])
+    async def pause(self):
+        await self.command(["cycle", "pause"])
 
-        text = "⏸ Paused" if self.get("pause") else "▶ Playing"
-        self.show_text(text, 1200)
+        text = "⏸ Paused" if await self.get("pause") else "▶ Playing"
+        await self.show_text(text, 1200)
 
-    def seek(self, delta: int):
-        self.command(["seek", str(delta), "relative"])
+    async def seek(self, delta: int):
+        await self.command(["seek", str(delta), "relative"])
 
         text = f"{("⏩ +" if delta > 0 else "⏪ -")}{abs(delta)} s"
-        self.show_text(text)
+        await self.show_text(text)
 
-    def volume(self, delta: int):
-        self.command(["add", "volume", str(delta)])
+    async def volume(self, delta: int):
+        await self.command(["add", "volume", str(delta)])
 
-        vol = int(self.get("volume") or 0)
+        vol = int(await self.get("volume") or 0)
         text = f"🔊 {vol}%"
-        self.show_text(text)
+        await self.show_text(text)
 
     def subtitles(self, id: Optional[int] = None):
         pass
 
-    def status(self):
-        if self.proc is None or self.proc.poll() is None:
+    async def status(self):
+        if self.proc is None or self.proc.returncode is not None:
             return {"running": False}
 
+        if self._writer is not None and len(self._props) == len(MPV_OBSERVED):
+            return self.__status(self._props)  # kept current by observers
+
+        try:
+            vals = await self._multi_get(MPV_OBSERVED)
+        except RuntimeError:
+            return {"running": False}  # mpv exiting / socket gone
+        return self.__status(vals)
+
+    @staticmethod
+    def __status(vals: dict[str, Any]) -> dict[str, Any]:
+        if vals["path"] is None:
+            return {"running": False}  # idle mpv, nothing loaded
         return {
             "running": True,
-            "file": os.path.basename(self.get("path") or ""),
-            "paused": bool(self.get("pause")),
-            "volume": int(self.get("volume") or 0),
+            "file": os.path.basename(vals["path"]),
+            "paused": bool(vals["pause"]),
+            "volume": int(vals["volume"] or 0),
         }